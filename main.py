@@ -1,16 +1,25 @@
-from google.auth.transport.requests import Request
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+# Heavier google client modules are imported where they are used, so that
+# MarkdownParser can be used without loading them
 from googleapiclient.errors import HttpError
 
 import os.path
-import pickle
 
 from enum import Enum
 import re
 
 SCOPES = ["https://www.googleapis.com/auth/documents"]
 
+# List item and heading, classified in a single match
+_LINE_RE = re.compile(
+    r"(?P<indent>[ \t]*)[-*] (?P<checkbox>\[ \])?(?P<item>.*)$"
+    r"|(?P<level>#+)\s(?P<heading>.*)$"
+)
+_TAG_RE = re.compile(r"(\@\w*):")
+# Precomputed tab prefixes for nested list items, indexed by indent level
+_TAB_PREFIX = tuple("\t" * i for i in range(16))
+# First non-blank characters that can start a line matched by _LINE_RE
+_LINE_MARKERS = ("-", "*", "#")
+
 try:
     from google.colab import auth
 
@@ -18,6 +27,14 @@ try:
 except:
     IN_COLAB = False
 
+# Credentials and authorized HTTP client shared by every DocumentService, so
+# the OAuth flow runs once and connections to the API are reused
+_CREDS_CACHE = None
+_HTTP_CACHE = None
+
+# Maximum number of calls the API accepts in one HTTP batch request
+_MAX_BATCH_SIZE = 1000
+
 
 class Mode(Enum):
     """Enum representing different parsing modes for markdown processing.
@@ -70,8 +87,6 @@ class DocumentService:
         except Exception as error:
             print(f"An unexpected error occurred: {error}")
             return None
-            print(f"Failed to update footer: {error}")
-            return None
 
     def create_document(self, title="New Document"):
         """Create a new Google Doc.
@@ -125,32 +140,66 @@ class DocumentService:
             print(f"An unexpected error occurred: {error}")
             return None
 
-    def update_footer(self, doc_id, footer_text):
+    def batch_update_many(self, doc_ops):
+        """Update several Google Docs with batched HTTP requests.
+
+        Documents are sent in groups of at most _MAX_BATCH_SIZE, the limit
+        of a single HTTP batch, and each group is one round-trip.
+
+        Args:
+            doc_ops (dict): Lists of update requests keyed by Google Document ID
+
+        Returns:
+            dict: Update response per document ID, None for documents that
+                failed, or None if a batch itself failed
+        """
+        results = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                print(f"API error for document {request_id}: {exception}")
+                results[request_id] = None
+            else:
+                results[request_id] = response
+
+        try:
+            items = list(doc_ops.items())
+            for start in range(0, len(items), _MAX_BATCH_SIZE):
+                batch = self.service.new_batch_http_request(callback=callback)
+                for doc_id, data in items[start : start + _MAX_BATCH_SIZE]:
+                    batch.add(
+                        self.service.documents().batchUpdate(
+                            documentId=doc_id, body={"requests": data}
+                        ),
+                        request_id=doc_id,
+                    )
+                batch.execute()
+            return results
+
+        except HttpError as error:
+            print(f"API error: {error}")
+            return None
+        except Exception as error:
+            print(f"An unexpected error occurred: {error}")
+            return None
+
+    def update_footer(self, doc_id, footer_text, footer_id=None):
         """Create or update the footer of a Google Doc.
 
+        If footer_id is given the text is inserted with a single batch
+        request, otherwise the document is looked up to find or create one.
+
         Args:
             doc_id (str): The Google Document ID
             footer_text (str): Text content for the footer
+            footer_id (str): ID of an existing footer, optional
 
         Returns:
             dict: Update response if successful, None if failed
         """
         try:
-            document = self.get_document(doc_id)
-            if not document.get("footers"):
-                req = [
-                    {
-                        "createFooter": {
-                            "type": "DEFAULT",
-                        }
-                    }
-                ]
-                self.service.documents().batchUpdate(
-                    documentId=doc_id, body={"requests": req}
-                ).execute()
-                document = self.get_document(doc_id)
-
-            footer_id = list(document["footers"].keys())[0]
+            if not footer_id:
+                footer_id = self._get_footer_id(doc_id)
 
             requests = [
                 {
@@ -167,6 +216,7 @@ class DocumentService:
                 .execute()
             )
             print(res)
+            return res
         except HttpError as error:
             if error.resp.status == 404:
                 print(f"Document {doc_id} not found")
@@ -177,11 +227,39 @@ class DocumentService:
             print(f"An unexpected error occurred: {error}")
             return None
 
+    def _get_footer_id(self, doc_id):
+        """Get the ID of the document's footer, creating one if missing.
+
+        Args:
+            doc_id (str): The Google Document ID
+
+        Returns:
+            str: Footer segment ID
+        """
+        document = self.service.documents().get(documentId=doc_id).execute()
+        if document.get("footers"):
+            return next(iter(document["footers"]))
+
+        res = (
+            self.service.documents()
+            .batchUpdate(
+                documentId=doc_id,
+                body={"requests": [{"createFooter": {"type": "DEFAULT"}}]},
+            )
+            .execute()
+        )
+        return res["replies"][0]["createFooter"]["footerId"]
+
     def _get_credentials(self):
         """Get Google docs api credentials.
 
         Stores retrieved credentials for future runs
         """
+        global _CREDS_CACHE
+        if _CREDS_CACHE is not None:
+            self.credentials = _CREDS_CACHE
+            return
+
         credentials = None
         credentials_file = "credentials.json"
         if IN_COLAB:
@@ -193,22 +271,27 @@ class DocumentService:
 
                 files.upload()
 
+            from google.oauth2 import service_account
+
             # Set credentials
             credentials = service_account.Credentials.from_service_account_file(
                 credentials_file, scopes=SCOPES
             )
         else:
-            import pickle
+            from google.oauth2.credentials import Credentials
             from google_auth_oauthlib.flow import InstalledAppFlow
 
             # Check for stored credentials
-            if os.path.exists("token.pickle"):
-                with open("token.pickle", "rb") as token:
-                    credentials = pickle.load(token)
+            if os.path.exists("token.json"):
+                credentials = Credentials.from_authorized_user_file(
+                    "token.json", SCOPES
+                )
 
             # If there are no valid credentials available, prompt user to log in
             if not credentials or not credentials.valid:
                 if credentials and credentials.expired and credentials.refresh_token:
+                    from google.auth.transport.requests import Request
+
                     credentials.refresh(Request())
                 else:
                     flow = InstalledAppFlow.from_client_secrets_file(
@@ -217,15 +300,34 @@ class DocumentService:
                     credentials = flow.run_local_server(port=0)
 
                 # Store credentials for future use
-                with open("token.pickle", "wb") as token:
-                    pickle.dump(credentials, token)
+                with open("token.json", "w") as token:
+                    token.write(credentials.to_json())
 
+        _CREDS_CACHE = credentials
         self.credentials = credentials
 
     def _initialize_service(self):
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build
+        from googleapiclient.http import build_http
+
+        global _HTTP_CACHE
         try:
             self._get_credentials()
-            docs_service = build("docs", "v1", credentials=self.credentials)
+            if _HTTP_CACHE is None:
+                # build_http keeps the client library's default timeout and
+                # redirect handling
+                _HTTP_CACHE = AuthorizedHttp(self.credentials, http=build_http())
+
+            # Use the discovery document bundled with google-api-python-client
+            # instead of fetching it over the network on every run
+            docs_service = build(
+                "docs",
+                "v1",
+                http=_HTTP_CACHE,
+                static_discovery=True,
+                cache_discovery=False,
+            )
             self.service = docs_service
         except Exception as error:
             print(f"An unexpected error occurred: {error}")
@@ -239,20 +341,13 @@ class MarkdownParser:
     appropriate Google Docs API requests.
     """
 
-    REGEX = {
-        "list": r"^(\s*)[-*] (\[ \])*(.*)$",
-        "heading": r"^(#+)\s(.*)$",
-        "tag": r"(\@\w*):",
-        "footer": r"^-+$",
-    }
-
     def __init__(self):
         self.index = 1
         self.mode = Mode.NONE
         self.list_start = 0
         self.indents = 0
-        self.list_type = ""
-        self.footer_text = ""
+        self.bullet_preset = ""
+        self.footer_lines = []
         self.requests = []
 
     def parse_file(self, filepath):
@@ -266,12 +361,20 @@ class MarkdownParser:
         """
         with open(filepath) as file:
             for line in file:
-                if line.strip():
-                    if self.mode == Mode.FOOTER:
-                        self.footer_text += line
-                    else:
-                        self._parse_line(line)
-        return self.requests, self.footer_text
+                # Blank lines carry no content, isspace avoids a strip() copy
+                if line.isspace():
+                    continue
+
+                if self._parse_line(line):
+                    break
+
+            # Footer mode is terminal, everything left is footer text
+            for line in file:
+                if not line.isspace():
+                    self.footer_lines.append(line)
+
+        self._coalesce_inserts()
+        return self.requests, "".join(self.footer_lines)
 
     def _parse_line(self, line):
         """Process a single line of markdown text.
@@ -279,84 +382,89 @@ class MarkdownParser:
 
         Args:
             line (str): Line of text to parse
+
+        Returns:
+            bool: True if the line starts the footer section
         """
         if self._check_footer(line):
-            return
+            return True
 
-        line = self._parse_list_item(line)
-        line = self._parse_heading(line)
+        match = None
+        if line.lstrip()[:1] in _LINE_MARKERS:
+            match = _LINE_RE.match(line)
+
+        line = self._parse_list_item(line, match)
+        line = self._parse_heading(line, match)
 
         self._parse_tag(line)
-        self.index += len(line.replace("\\", ""))
+        self.index += len(line) - line.count("\\")
+        return False
 
-    def _parse_list_item(self, line):
+    def _parse_list_item(self, line, match):
         """Parse a markdown list item.
 
         Args:
             line (str): Line of text to parse
+            match (re.Match): Line classification from _LINE_RE, or None
 
         Returns:
             str: Final parse text
         """
-        match = re.search(self.REGEX["list"], line)
-        if not match:
+        if not match or match.lastgroup != "item":
             if self.mode == Mode.LIST:
                 self._end_list()
             return line
 
-        indent_spaces, is_checkbox, text = match.groups()
+        indent_spaces, is_checkbox, text = match.group("indent", "checkbox", "item")
 
         if not self.mode == Mode.LIST:
             self.list_start = self.index
             self.mode = Mode.LIST
-            self.list_type = "CHECKBOX" if is_checkbox else "DISC_CIRCLE_SQUARE"
+            self.bullet_preset = (
+                "BULLET_CHECKBOX" if is_checkbox else "BULLET_DISC_CIRCLE_SQUARE"
+            )
 
         indent_level = len(indent_spaces) // 2
-        text = ("\t" * indent_level) + text + "\n"
+        if indent_level < len(_TAB_PREFIX):
+            prefix = _TAB_PREFIX[indent_level]
+        else:
+            prefix = "\t" * indent_level
+        text = prefix + text + "\n"
         self.indents += indent_level
 
-        self.requests.append(
-            {"insertText": {"location": {"index": self.index}, "text": text}},
-        )
+        self._insert_text(text)
         return text
 
-    def _parse_heading(self, line):
+    def _parse_heading(self, line, match):
         """Parse a markdown heading.
 
         Args:
             line (str): Line of text to parse
+            match (re.Match): Line classification from _LINE_RE, or None
 
         Returns:
             str: Processed heading text
         """
-        match = re.search(self.REGEX["heading"], line)
-        if not match:
+        if not match or match.lastgroup != "heading":
             return line
 
-        level, text = match.groups()
+        level, text = match.group("level", "heading")
         level = len(level)
 
-        self.requests.extend(
-            [
-                {
-                    "insertText": {
-                        "location": {"index": self.index},
-                        "text": text + "\n",
-                    }
-                },
-                {
-                    "updateParagraphStyle": {
-                        "range": {
-                            "startIndex": self.index,
-                            "endIndex": self.index + len(text),
-                        },
-                        "paragraphStyle": {
-                            "namedStyleType": f"HEADING_{level}",
-                        },
-                        "fields": "namedStyleType",
-                    }
-                },
-            ]
+        self._insert_text(text + "\n")
+        self.requests.append(
+            {
+                "updateParagraphStyle": {
+                    "range": {
+                        "startIndex": self.index,
+                        "endIndex": self.index + len(text),
+                    },
+                    "paragraphStyle": {
+                        "namedStyleType": f"HEADING_{level}",
+                    },
+                    "fields": "namedStyleType",
+                }
+            }
         )
 
         self.index += 1
@@ -372,7 +480,10 @@ class MarkdownParser:
         Returns:
             bool: True if tag was found and processed
         """
-        match = re.search(self.REGEX["tag"], line)
+        if "@" not in line:
+            return False
+
+        match = _TAG_RE.search(line)
         if not match:
             return False
 
@@ -394,14 +505,16 @@ class MarkdownParser:
     def _check_footer(self, line):
         """Check if line indicates start of footer section.
 
+        The delimiter is a line made only of dashes, checked with plain
+        string operations rather than a regex.
+
         Args:
             line (str): Line of text to check
 
         Returns:
             bool: True if footer delimiter found
         """
-        match = re.search(self.REGEX["footer"], line)
-        if not match:
+        if not line.startswith("-") or line.rstrip("\n").strip("-"):
             return False
 
         if self.mode == Mode.LIST:
@@ -410,6 +523,47 @@ class MarkdownParser:
         self.mode = Mode.FOOTER
         return True
 
+    def _insert_text(self, text):
+        """Add an insertText request at the current index.
+
+        Args:
+            text (str): Text to insert
+        """
+        self.requests.append(
+            {"insertText": {"location": {"index": self.index}, "text": text}},
+        )
+
+    def _coalesce_inserts(self):
+        """Merge runs of contiguous insertText requests into one request.
+
+        A run is a sequence of inserts where each one starts at the end of
+        the previous, such as consecutive list items. Any other request
+        ends the run. Texts are collected and joined once per run.
+        """
+        coalesced = []
+        run = []
+        end = None
+        for request in self.requests:
+            insert = request.get("insertText")
+            if insert and run and insert["location"]["index"] == end:
+                run.append(insert["text"])
+                end += len(insert["text"])
+                continue
+
+            if len(run) > 1:
+                coalesced[-1]["insertText"]["text"] = "".join(run)
+
+            run = []
+            if insert:
+                run.append(insert["text"])
+                end = insert["location"]["index"] + len(insert["text"])
+            coalesced.append(request)
+
+        if len(run) > 1:
+            coalesced[-1]["insertText"]["text"] = "".join(run)
+
+        self.requests = coalesced
+
     def _end_list(self):
         """Finalize the current list processing and reset list state."""
         self.requests.append(
@@ -419,7 +573,7 @@ class MarkdownParser:
                         "startIndex": self.list_start,
                         "endIndex": self.index,
                     },
-                    "bulletPreset": f"BULLET_{self.list_type}",
+                    "bulletPreset": self.bullet_preset,
                 }
             }
         )
@@ -436,11 +590,22 @@ if __name__ == "__main__":
     parser = MarkdownParser()
 
     doc_id = ""
-    if not doc_id:
+    new_document = not doc_id
+    if new_document:
         doc_id = service.create_document("New Note").get("documentId")
 
     requests, footer_content = parser.parse_file("note.md")
-    service.update_document(doc_id, requests)
+
+    # A new document has no footer, so create it in the same batch as the
+    # content and take its ID from the matching reply
+    create_footer = footer_content and new_document
+    if create_footer:
+        requests.append({"createFooter": {"type": "DEFAULT"}})
+
+    res = service.update_document(doc_id, requests)
 
     if footer_content:
-        service.update_footer(doc_id, footer_content)
+        footer_id = None
+        if create_footer and res:
+            footer_id = res["replies"][-1]["createFooter"]["footerId"]
+        service.update_footer(doc_id, footer_content, footer_id)